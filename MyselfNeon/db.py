@@ -1,9 +1,16 @@
 import motor.motor_asyncio
 import logging
+from collections import OrderedDict
 from config import DB_NAME, DB_URI
 
 logger = logging.getLogger(__name__)
 
+# Fields returned when iterating over all users (skips Mongo's internal _id)
+USER_PROJECTION = {'id': 1, 'name': 1, 'session': 1, '_id': 0}
+
+# Upper bound on cached user IDs; the oldest entries are evicted first
+KNOWN_USERS_LIMIT = 100_000
+
 class Database:
     """
     Asynchronous MongoDB client using motor.
@@ -11,6 +18,10 @@ class Database:
     """
     
     def __init__(self, uri, database_name):
+        # In-process copy of tracking state; this bot is the only writer, so it never goes stale
+        self._state_cache = {}
+        # IDs already confirmed to exist in the users collection (insertion-ordered for FIFO eviction)
+        self._known_users = OrderedDict()
         # Initialize client, check if DB_URI is set
         if not uri:
             logger.error("DB_URI is not set! Database functions will fail.")
@@ -28,20 +39,35 @@ class Database:
     async def get_state(self, key):
         """Retrieves a specific tracking state (e.g., user status, forum threads)."""
         if not self._client: return None
+        # Only the first lookup per key hits MongoDB, later checks are served from memory
+        if key in self._state_cache:
+            return self._state_cache[key]
         data = await self.state_col.find_one({'_id': key})
-        return data.get('value') if data else None
+        value = data.get('value') if data else None
+        self._state_cache[key] = value
+        return value
 
     async def set_state(self, key, value):
-        """Saves a specific tracking state."""
+        """Saves a specific tracking state (skipped when it equals the cached value)."""
         if not self._client: return
+        # Values are replaced, never mutated in place, so equality means nothing changed
+        if key in self._state_cache and self._state_cache[key] == value:
+            return
         await self.state_col.update_one(
             {'_id': key},
             {'$set': {'value': value}},
             upsert=True
         )
+        self._state_cache[key] = value
 
     # --- User Management (General) ---
 
+    def _remember_user(self, id):
+        """Caches a confirmed user ID, evicting the oldest once KNOWN_USERS_LIMIT is reached."""
+        self._known_users[id] = None
+        if len(self._known_users) > KNOWN_USERS_LIMIT:
+            self._known_users.popitem(last=False)
+
     def new_user(self, id, name):
         """Creates a default user dictionary."""
         return dict(
@@ -50,34 +76,54 @@ class Database:
             session = None,
         )
     
+    async def ensure_indexes(self):
+        """Creates the unique index on user IDs that add_user's upsert relies on."""
+        if not self._client: return
+        try:
+            await self.user_col.create_index('id', unique=True)
+        except Exception as e:
+            logger.error(f"Failed to create users index: {e}")
+
     async def add_user(self, id, name):
         """Adds a new user to the users collection."""
         if not self._client: return
-        if not await self.is_user_exist(id):
-            user = self.new_user(id, name)
-            await self.user_col.insert_one(user)
+        if int(id) in self._known_users:
+            return
+        # A single upsert replaces the check-then-insert pair and cannot race
+        await self.user_col.update_one(
+            {'id': int(id)},
+            {'$setOnInsert': self.new_user(int(id), name)},
+            upsert=True
+        )
+        self._remember_user(int(id))
     
     async def is_user_exist(self, id):
         """Checks if a user exists in the users collection."""
         if not self._client: return False
+        # Returning users are answered from memory without a DB round-trip
+        if int(id) in self._known_users:
+            return True
         user = await self.user_col.find_one({'id':int(id)})
+        if user:
+            self._remember_user(int(id))
         return bool(user)
     
     async def total_users_count(self):
-        """Counts the total number of users."""
+        """Counts the total number of users from collection metadata (no index scan)."""
         if not self._client: return 0
-        count = await self.user_col.count_documents({})
+        count = await self.user_col.estimated_document_count()
         return count
 
-    async def get_all_users(self):
-        """Retrieves a cursor of all users."""
+    async def get_all_users(self, projection=None, batch_size=1000):
+        """Retrieves a cursor of all users, fetching only the projected fields in large batches."""
         if not self._client: return []
-        return self.user_col.find({})
+        return self.user_col.find({}, projection or USER_PROJECTION).batch_size(batch_size)
 
     async def delete_user(self, user_id):
         """Deletes a user from the users collection."""
         if not self._client: return
         await self.user_col.delete_many({'id': int(user_id)})
+        self._known_users.pop(int(user_id), None)
 
     async def set_session(self, id, session):
         """Sets a user's session data."""
@@ -0,0 +1,23 @@
+import httpx
+from config import CHECK_INTERVAL
+
+# Browser User-Agent sent with every scraping request
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# One client for the whole process, so the scheduler and /check share warm
+# connections (and TLS sessions) instead of opening a new pool per check.
+# HTTP/2 lets concurrent fetches to platinmods.com multiplex over one socket.
+http_client = httpx.AsyncClient(
+    http2=True,
+    # Fail fast when the site is unreachable, but allow slow page responses
+    timeout=httpx.Timeout(20.0, connect=5.0),
+    headers={"User-Agent": USER_AGENT},
+    # httpx drops idle connections after 5s by default; keep them past one
+    # CHECK_INTERVAL sleep so every poll reuses the sockets of the previous one
+    limits=httpx.Limits(
+        max_connections=32,
+        max_keepalive_connections=16,
+        keepalive_expiry=max(CHECK_INTERVAL + 10, 75)
+    ),
+    follow_redirects=True
+)
@@ -1,6 +1,8 @@
 import asyncio
 import logging
-from bs4 import BeautifulSoup
+from functools import lru_cache
+from urllib.parse import urljoin
+from selectolax.lexbor import LexborHTMLParser
 from config import USER_TARGETS, FORUM_TARGETS, NOTIFICATION_CHAT_ID
 
 # Import the new database module (Corrected path)
@@ -9,25 +11,121 @@ from MyselfNeon.db import db
 # Configure Logger for this module
 logger = logging.getLogger(__name__)
 
+# Forum targets frozen once into (name, url) pairs for the check loop
+FORUM_ITEMS = tuple(FORUM_TARGETS.items())
+
+# Base for the site-relative links found in forum listings
+SITE_URL = "https://platinmods.com"
+
+# --- Notification Templates ---
+USER_ONLINE_TMPL = "🚨 **__USER ALERT__**\n\n👤 **__{name}** is now **ONLINE__**! 🟢\n🔗 **__[Profile Link]({url})__**"
+USER_OFFLINE_TMPL = "💤 **__STATUS UPDATE__**\n\n👤 **__{name}** is now **OFFLINE__** 🔴"
+NEW_THREAD_TMPL = "🚨 **__NEW THREAD** \n– in {forum}__\n\n📝 __{title}\n🔗 **[View Thread]({url})__**"
+THREAD_REMOVED_TMPL = "🗑 **__THREAD REMOVED** \n– from {forum}__\n\n📝 __{title}__"
+
+# --- Selectors (XenForo 2 markup) ---
+# Adjust USER_TITLE_SELECTOR to the actual class found via Inspect Element.
+USER_TITLE_SELECTOR = 'span.userTitle'
+# XenForo marks online members with a badge class ("Online now" tooltip). Scoped to the
+# profile header: the same badges appear on other members' posts further down the page.
+ONLINE_SELECTOR = '.memberHeader .avatar--online, .memberHeader .username--online'
+# Thread title links in a forum listing (prefix/label links are filtered out by href)
+THREAD_SELECTOR = '.structItem-title a[href*="threads/"]'
+
 # --- Helper Functions ---
 # NOTE: File-based state functions are removed as state is now in MongoDB.
 
-async def get_soup(url, client):
-    """Fetches a URL and returns a BeautifulSoup object."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+# url -> (ETag, Last-Modified, parsed tree) of the last successful fetch
+_page_cache = {}
+
+# Caps parallel requests to platinmods.com now that targets are fetched concurrently
+_fetch_semaphore = asyncio.Semaphore(5)
+
+# Rate-limit and server-error responses are retried with exponential back-off
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_FETCH_ATTEMPTS = 3
+
+# Caps parallel alerts to stay clear of Telegram's per-chat flood limit
+_send_semaphore = asyncio.Semaphore(3)
+
+# Telegram rejects messages over 4096 characters; leave room for formatting
+MAX_MESSAGE_LENGTH = 4000
+ALERT_SEPARATOR = "\n\n"
+
+async def get_tree(url, client):
+    """
+    Fetches a URL and returns a parsed selectolax (Lexbor) tree.
+    Sends conditional headers when the page was seen before; on 304 Not Modified
+    the previously parsed tree is returned without downloading or parsing again.
+    """
+    headers = {}
+    cached = _page_cache.get(url)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    # User-Agent and redirect handling come from the shared client's defaults
     try:
-        response = await client.get(url, headers=headers, follow_redirects=True)
+        for attempt in range(MAX_FETCH_ATTEMPTS):
+            async with _fetch_semaphore:
+                response = await client.get(url, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_FETCH_ATTEMPTS - 1:
+                break
+            # Back off outside the semaphore so other targets can still be fetched
+            delay = 2 ** attempt
+            logger.warning(f"{url} returned {response.status_code}, retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+        if response.status_code == 304 and cached:
+            return cached[2]
         response.raise_for_status()
         
-        # Move CPU-bound parsing work to a separate thread
-        soup = await asyncio.to_thread(BeautifulSoup, response.content, 'html.parser')
-        return soup
+        # The C parser takes a few milliseconds, no need to leave the event loop
+        tree = LexborHTMLParser(response.content)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            _page_cache[url] = (etag, last_modified, tree)
+        return tree
     except Exception as e:
         logger.error(f"Failed to fetch {url}: {e}")
         return None
 
+@lru_cache(maxsize=4096)
+def absolute_url(href):
+    """Resolves a link against SITE_URL; the same thread links repeat across polls."""
+    return urljoin(SITE_URL, href)
+
+async def send_alert(bot, msg, **kwargs):
+    """Sends one alert to NOTIFICATION_CHAT_ID. Returns True if Telegram accepted it."""
+    async with _send_semaphore:
+        try:
+            await bot.send_message(NOTIFICATION_CHAT_ID, msg, **kwargs)
+            return True
+        except Exception as e:
+            logger.error(f"Telegram Error: {e}")
+            return False
+
+def group_alerts(messages, limit=MAX_MESSAGE_LENGTH):
+    """
+    Splits alert texts into consecutive groups that fit one Telegram message when
+    joined with ALERT_SEPARATOR. Returns a list of slices into `messages`.
+    """
+    groups = []
+    start, size = 0, 0
+    for i, msg in enumerate(messages):
+        added = len(msg) if i == start else len(ALERT_SEPARATOR) + len(msg)
+        if i > start and size + added > limit:
+            groups.append(slice(start, i))
+            start, size, added = i, 0, len(msg)
+        size += added
+    if start < len(messages):
+        groups.append(slice(start, len(messages)))
+    return groups
+
 # --- Tracking Logic ---
 async def check_user_status(http_client, bot):
     """
@@ -35,21 +133,25 @@ async def check_user_status(http_client, bot):
     Uses MongoDB to store the last known status.
     """
     user_status = {}
-    for target in USER_TARGETS:
-        soup = await get_soup(target['url'], http_client)
-        if not soup:
-            user_status[target['name']] = "Error"
+    # (state_key, new status, alert message) for every user whose status flipped
+    transitions = []
+    # Fetch every profile concurrently, then process the results in order
+    trees = await asyncio.gather(*(get_tree(target.url, http_client) for target in USER_TARGETS))
+    for target, tree in zip(USER_TARGETS, trees):
+        if not tree:
+            user_status[target.name] = "Error"
             continue
 
         is_online = False
         
-        # Adjust 'userTitle' to the actual class found via Inspect Element.
-        status_element = soup.find('span', class_='userTitle') 
+        status_element = tree.css_first(USER_TITLE_SELECTOR)
+        # A selector lookup on the badge replaces scanning every text node of the page
+        online_badge = tree.css_first(ONLINE_SELECTOR)
         
-        if soup.find(string="Online now") or (status_element and "Online" in status_element.get_text()):
+        if online_badge is not None or (status_element and "Online" in status_element.text()):
             is_online = True
 
-        state_key = f"user_status_{target['name']}"
+        state_key = f"user_status_{target.name}"
         # Fetch the last known state from MongoDB
         was_online = await db.get_state(state_key)
         
@@ -62,23 +164,28 @@ async def check_user_status(http_client, bot):
 
         if is_online and not was_online:
             # User just came online
-            msg = f"🚨 **__USER ALERT__**\n\n👤 **__{target['name']}** is now **ONLINE__**! 🟢\n🔗 **__[Profile Link]({target['url']})__**"
-            try:
-                await bot.send_message(NOTIFICATION_CHAT_ID, msg, disable_web_page_preview=True)
-                await db.set_state(state_key, True)
-            except Exception as e:
-                logger.error(f"Telegram Error: {e}")
+            msg = USER_ONLINE_TMPL.format(name=target.name, url=target.url)
+            transitions.append((state_key, True, msg))
         
         elif not is_online and was_online:
             # User just went offline
-            msg = f"💤 **__STATUS UPDATE__**\n\n👤 **__{target['name']}** is now **OFFLINE__** 🔴"
-            try:
-                await bot.send_message(NOTIFICATION_CHAT_ID, msg, disable_web_page_preview=True)
-                await db.set_state(state_key, False)
-            except Exception as e:
-                logger.error(f"Telegram Error: {e}")
+            msg = USER_OFFLINE_TMPL.format(name=target.name)
+            transitions.append((state_key, False, msg))
         
-        user_status[target['name']] = "Online" if is_online else "Offline"
+        user_status[target.name] = "Online" if is_online else "Offline"
+
+    # Send all alerts as few combined messages as possible; only persist the statuses
+    # whose message was delivered, so a failed alert is retried on the next check.
+    messages = [msg for _, _, msg in transitions]
+    groups = group_alerts(messages)
+    sent = await asyncio.gather(*(
+        send_alert(bot, ALERT_SEPARATOR.join(messages[group]), disable_web_page_preview=True)
+        for group in groups
+    ))
+    for group, ok in zip(groups, sent):
+        if ok:
+            for state_key, is_online, _ in transitions[group]:
+                await db.set_state(state_key, is_online)
         
     return user_status
 
@@ -89,22 +196,21 @@ async def check_forums(http_client, bot):
     """
     forum_counts = {}
     
-    for forum_name, url in FORUM_TARGETS.items():
-        soup = await get_soup(url, http_client)
-        if not soup:
+    # Fetch every forum page concurrently, then process the results in order
+    trees = await asyncio.gather(*(get_tree(url, http_client) for _, url in FORUM_ITEMS))
+    for (forum_name, _), tree in zip(FORUM_ITEMS, trees):
+        if not tree:
             forum_counts[forum_name] = "Error"
             continue
 
-        # XenForo 2 generic selector for thread titles
-        thread_links = soup.select('.structItem-title a')
+        thread_links = tree.css(THREAD_SELECTOR)
         
-        current_threads = []
+        # url -> title; dict keys drop repeated links and make the diff below O(1) per URL
+        current_threads = {}
         for link in thread_links:
-            text = link.get_text(strip=True)
-            href = link.get('href')
-            if href and "threads/" in href:
-                full_url = f"https://platinmods.com{href}" if href.startswith('/') else href
-                current_threads.append({"title": text, "url": full_url})
+            full_url = absolute_url(link.attributes['href'])
+            if full_url not in current_threads:
+                current_threads[full_url] = link.text(strip=True)
         
         forum_counts[forum_name] = len(current_threads)
 
@@ -116,33 +222,38 @@ async def check_forums(http_client, bot):
         if previous_threads_list is None:
             previous_threads_list = []
             
-        prev_urls = {t['url'] for t in previous_threads_list}
-        curr_urls = {t['url'] for t in current_threads}
-
-        new_urls = curr_urls - prev_urls
-        removed_urls = prev_urls - curr_urls
-
-        # Process New Threads
-        if new_urls:
-            for item in current_threads:
-                if item['url'] in new_urls:
-                    msg = f"🚨 **__NEW THREAD** \n– in {forum_name}__\n\n📝 __{item['title']}\n🔗 **[View Thread]({item['url']})__**"
-                    try:
-                        await bot.send_message(NOTIFICATION_CHAT_ID, msg)
-                    except Exception as e:
-                        logger.error(f"Telegram Error: {e}")
+        # Older state stored {title, url} dicts; it is rewritten as pairs on the next change
+        if previous_threads_list and isinstance(previous_threads_list[0], dict):
+            previous_threads = {t['url']: t['title'] for t in previous_threads_list}
+        else:
+            previous_threads = dict(previous_threads_list)
+
+        # Steady state: the same threads as last time, nothing to announce or save
+        if current_threads.keys() == previous_threads.keys():
+            continue
+
+        forum_messages = []
+
+        # Process New Threads (page order is kept)
+        for url, title in current_threads.items():
+            if url not in previous_threads:
+                forum_messages.append(NEW_THREAD_TMPL.format(forum=forum_name, title=title, url=url))
 
         # Process Removed Threads
-        if removed_urls:
-            for item in previous_threads_list:
-                if item['url'] in removed_urls:
-                    msg = f"🗑 **__THREAD REMOVED** \n– from {forum_name}__\n\n📝 __{item['title']}__"
-                    try:
-                        await bot.send_message(NOTIFICATION_CHAT_ID, msg)
-                    except Exception as e:
-                        logger.error(f"Telegram Error: {e}")
-
-        # Save new state (list of current threads)
-        await db.set_state(state_key, current_threads)
+        for url, title in previous_threads.items():
+            if url not in current_threads:
+                forum_messages.append(THREAD_REMOVED_TMPL.format(forum=forum_name, title=title))
+
+        # One message per forum (split only when it would exceed Telegram's limit). Sent before
+        # the state below is saved, so a later DB error cannot drop alerts for a recorded change.
+        # send_alert logs its own failures, so the results need no further handling
+        await asyncio.gather(*(
+            send_alert(bot, ALERT_SEPARATOR.join(forum_messages[group]))
+            for group in group_alerts(forum_messages)
+        ))
+
+        # Save new state as [url, title] pairs: URLs contain dots, which MongoDB
+        # does not accept in field names, so the dict is not stored as-is
+        await db.set_state(state_key, list(current_threads.items()))
 
     return forum_counts
@@ -1,18 +1,16 @@
-from flask import Flask
-import threading
+from aiohttp import web
 
-app = Flask(__name__)
+app = web.Application()
 
-@app.route('/')
-def health_check():
-    return "Platinmods Tracker Bot is Alive!"
+async def health_check(request):
+    return web.Response(text="Platinmods Tracker Bot is Alive!")
 
-def run_web_server(port):
-    """Runs the Flask app in a separate thread."""
-    app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+app.router.add_get('/', health_check)
 
-def start_web_server(port):
-    """Helper to start the server thread."""
-    t = threading.Thread(target=run_web_server, args=(port,))
-    t.daemon = True
-    t.start()
\ No newline at end of file
+async def start_web_server(port):
+    """Serves the app on the running event loop, no separate thread needed."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    return runner
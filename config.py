@@ -1,4 +1,5 @@
 import os
+from collections import namedtuple
 from dotenv import load_dotenv
 
 # Load variables from .env file if it exists (for local development)
@@ -16,8 +17,22 @@ OWNER_ID = int(os.getenv("OWNER_ID", 841851780))
 
 # A comma-separated list of authorized Telegram User IDs (e.g., "12345,56789")
 AUTH_USERS_STRING = os.getenv("AUTH_USERS", "")
-# Convert the string of IDs into a set of integers for efficient lookup
-AUTH_USERS = {int(x.strip()) for x in AUTH_USERS_STRING.split(',') if x.strip().isdigit()}
+
+def _parse_ids(ids_string):
+    """Parses a comma-separated ID list in one pass, skipping blanks and non-integers."""
+    ids = set()
+    for x in ids_string.split(','):
+        x = x.strip()
+        if not x:
+            continue
+        try:
+            ids.add(int(x))
+        except ValueError:
+            pass
+    return ids
+
+# Convert the string of IDs into a frozen set of integers for O(1) lookup
+AUTH_USERS = frozenset(_parse_ids(AUTH_USERS_STRING))
 
 # --- Database Config (MongoDB) ---
 # Your Mongodb Database Url
@@ -30,19 +45,23 @@ DB_NAME = os.getenv("DB_NAME", "PMT-Testing")
 NOTIFICATION_CHAT_ID = int(os.getenv("NOTIFICATION_CHAT_ID", 0))
 
 # Check interval in seconds (Default: 20 seconds)
+# The shared HTTP client keeps idle connections alive slightly longer than this.
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", 20))
 
 # Server Port (Required for cloud deployments)
 PORT = int(os.getenv("PORT", 8080))
 
 # --- Tracking Targets ---
-USER_TARGETS = [
-    {
-        "name": "Darealpanda",
-        "url": "https://platinmods.com/members/darealpanda.115207/",
-        "selector": "span.userTitle" # NOTE: You must verify this selector via Inspect Element
-    }
-]
+# Immutable records read as target.name / target.url by the tracking loop
+UserTarget = namedtuple("UserTarget", "name url selector")
+
+USER_TARGETS = (
+    UserTarget(
+        name="Darealpanda",
+        url="https://platinmods.com/members/darealpanda.115207/",
+        selector="span.userTitle" # NOTE: You must verify this selector via Inspect Element
+    ),
+)
 
 FORUM_TARGETS = {
     "Shared Android Mods": "https://platinmods.com/forums/untested-shared-android-mods.150/",
@@ -1,14 +1,29 @@
 import asyncio
 import logging
+import random
+import time
+
+# uvloop speeds up the socket-heavy event loop; it must be installed before the
+# Pyrogram client below grabs its loop. Falls back to asyncio where unavailable.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 import httpx
-import aiohttp 
-from pyrogram import Client, filters
+from pymongo.errors import PyMongoError
+from pyrogram import Client, filters, idle
+from pyrogram.enums import ChatType
+from pyrogram.errors import RPCError
 # Import ALL necessary config variables, including the new auth ones
 from config import API_ID, API_HASH, BOT_TOKEN, NOTIFICATION_CHAT_ID, CHECK_INTERVAL, PORT, OWNER_ID, AUTH_USERS
 from app import start_web_server
 
 # Import tracking logic from the new module
 from MyselfNeon.track import check_user_status, check_forums
+from MyselfNeon.db import db
+from MyselfNeon.http_client import http_client
 
 # YOUR KEEP ALIVE URL HERE
 KEEP_ALIVE_URL = "https://website-monitor-v0q9.onrender.com/" 
@@ -17,26 +32,28 @@ KEEP_ALIVE_URL = "https://website-monitor-v0q9.onrender.com/"
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Global flag to track if the initial ready message has been sent
-BOT_READY_MESSAGE_SENT = False
+# The 'Bot Online' message is sent at most once per this many seconds, even across
+# restarts (free-tier hosts put the process to sleep and wake it up frequently)
+READY_MESSAGE_TTL = 3600
+
+# Set once the Telegram client has started; the scheduler waits on it
+BOT_READY = asyncio.Event()
+
+# Scrape task shared by /check commands that arrive while one is already running
+INFLIGHT_CHECK = None
+
+# Running /check report tasks; the event loop only keeps weak references to tasks
+CHECK_TASKS = set()
+
+# Held for the whole of every scrape, scheduled or manual, so they queue instead of overlapping
+SCRAPE_LOCK = asyncio.Lock()
 
 # --- Authorization Filter ---
 def auth_user_filter(_, client, message):
     """Custom filter to check if the user is the owner or an authorized user."""
-    # Check if the message has a user (not a channel post or other non-user message)
-    if not message.from_user:
-        return False
-        
-    user_id = message.from_user.id
-    
-    # Check for Owner ID first, then Authorized Users set
-    is_authorized = user_id == OWNER_ID or user_id in AUTH_USERS
-    
-    if not is_authorized:
-        logger.warning(f"Unauthorized access attempt by user ID: {user_id}")
-        asyncio.create_task(message.reply("⛔ **__Access Denied__**\n__You are not authorized to use this command.__"))
-        
-    return is_authorized
+    # Pure predicate: no replies from here, the denial is sent by its own handler
+    user = message.from_user
+    return bool(user and (user.id == OWNER_ID or user.id in AUTH_USERS))
 
 # Pyrogram filters must be callable, we assign the function to a variable
 authorized_users_only = filters.create(auth_user_filter)
@@ -50,81 +67,186 @@ bot = Client(
     bot_token=BOT_TOKEN
 )
 
+async def run_checks(client):
+    """Runs both checks concurrently, waiting for any scrape already in progress."""
+    async with SCRAPE_LOCK:
+        # Both checks hit independent pages, so they run concurrently on the shared client.
+        # Both are always waited for, so the lock is never released while one still runs.
+        results = await asyncio.gather(
+            check_user_status(http_client, client),
+            check_forums(http_client, client),
+            return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
 # --- Scheduler ---
 async def scheduler():
     """Main loop. Waits for the Pyrogram client to be running before executing."""
-    global BOT_READY_MESSAGE_SENT
-    
-    # Wait until the bot client is fully started (Pyrogram 2.x uses .is_connected)
-    while not bot.is_connected:
-        logger.info("Scheduler waiting for Telegram client to start...")
-        await asyncio.sleep(5)
+    # Wait until the bot client is fully started (resumes as soon as run_bot signals it)
+    logger.info("Scheduler waiting for Telegram client to start...")
+    await BOT_READY.wait()
 
-    # *** Send ready message once per process startup/restart ***
-    if not BOT_READY_MESSAGE_SENT:
+    await db.ensure_indexes()
+
+    # *** Send ready message after a restart, unless one went out recently ***
+    # A failed read only means the message may be sent again; it must never stop the loop below
+    try:
+        last_sent = await db.get_state("bot_ready_sent_at")
+    except PyMongoError as e:
+        logger.warning("Could not read last ready message time: %s", e)
+        last_sent = None
+    now = time.time()
+    if now - (last_sent or 0) > READY_MESSAGE_TTL:
         try:
             msg = "✅ **__Bot Online & Monitoring:\n\nI have Successfully Reconnected to Telegram. The monitoring schedule has been initialized (Happens after every server Restart).__**"
             await bot.send_message(NOTIFICATION_CHAT_ID, msg)
             logger.info("Sent 'Bot Ready' message after restart.")
-            BOT_READY_MESSAGE_SENT = True
+            await db.set_state("bot_ready_sent_at", now)
         except Exception as e:
             logger.error(f"Failed to send ready message: {e}")
+    else:
+        logger.info("Skipped 'Bot Ready' message, last one sent %ds ago", now - last_sent)
             
     # *********************************************
-    async with httpx.AsyncClient(timeout=20.0) as http_client:
-        while True:
-            logger.info("Checking targets...")
-            # Pass the bot instance to the tracking functions
-            await check_user_status(http_client, bot)
-            await check_forums(http_client, bot)
-            logger.info(f"Sleeping for {CHECK_INTERVAL}s")
-            await asyncio.sleep(CHECK_INTERVAL)
+    loop = asyncio.get_running_loop()
+    backoff = 0
+    while True:
+        # Wake-ups are scheduled from the start of a cycle, so slow cycles don't drift
+        next_wake = loop.time() + CHECK_INTERVAL
+        logger.info("Checking targets...")
+        # On failure, back off exponentially (capped at 10x CHECK_INTERVAL) instead of hammering upstream
+        failure_backoff = min((backoff or CHECK_INTERVAL) * 2, CHECK_INTERVAL * 10)
+        try:
+            user_status, forum_counts = await run_checks(bot)
+            # get_tree absorbs fetch errors, so an upstream outage shows up as every target being "Error"
+            results = [*user_status.values(), *forum_counts.values()]
+            if results and all(r == "Error" for r in results):
+                backoff = failure_backoff
+                logger.error(f"Check cycle failed, backing off for {backoff}s: every target failed to fetch")
+            else:
+                backoff = 0
+        except Exception:
+            # Anything raised here is unexpected, so keep the traceback
+            backoff = failure_backoff
+            logger.exception(f"Check cycle failed, backing off for {backoff}s")
+
+        # A little jitter keeps multiple replicas from polling in lockstep
+        delay = (backoff or max(0, next_wake - loop.time())) + random.uniform(0, 0.1) * CHECK_INTERVAL
+        logger.info(f"Sleeping for {delay:.1f}s")
+        await asyncio.sleep(delay)
 
 # --- Keep-Alive Function ---
 async def keep_alive():
-    """Send a request every 300 seconds to keep the bot alive (if required)."""
+    """
+    Send a request every 300 seconds to keep the bot alive (if required).
+    Consecutive failures double the wait (capped at 1 hour) until a ping succeeds.
+    """
     if not KEEP_ALIVE_URL:
         logging.warning("KEEP_ALIVE_URL is not configured — skipping keep-alive task.")
         return
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                async with session.get(KEEP_ALIVE_URL) as resp:
-                    if resp.status == 200:
-                        logging.info("✅ Keep-alive ping successful.")
-                    else:
-                        logging.warning(f"⚠️ Keep-alive returned status {resp.status}")
-            except Exception as e:
-                logging.error(f"❌ Keep-alive request failed: {e}")
-            await asyncio.sleep(300)
+    failures = 0
+    # Pings reuse the shared client's pooled connection to the keep-alive host
+    while True:
+        try:
+            resp = await http_client.get(KEEP_ALIVE_URL)
+            if resp.status_code == 200:
+                logging.info("✅ Keep-alive ping successful.")
+                failures = 0
+            else:
+                logging.warning(f"⚠️ Keep-alive returned status {resp.status_code}")
+                failures += 1
+        except httpx.HTTPError as e:
+            # Transient network errors: one warning line, no traceback
+            logging.warning("❌ Keep-alive request failed: %s", e)
+            failures += 1
+        except Exception:
+            # Anything else (e.g. an h2 protocol error) is logged in full, but must not end the loop
+            logger.exception("❌ Unexpected keep-alive error")
+            failures += 1
+        await asyncio.sleep(min(300 * 2 ** failures, 3600))
 
 # --- Bot Commands ---
+# /start replies; only the chat ID (and chat type for groups) vary per message
+PRIVATE_START_TMPL = (
+    "👋 **__Bot is Online!__**\n\n"
+    "__**Your PRIVATE Chat ID is:__** `{chat_id}`\n\n"
+    "**__Action Required: Set this positive ID __**"
+    "**__in your configuration to receive alerts.__**"
+)
+GROUP_START_TMPL = (
+    "👋 **__Bot is Online!__**\n\n"
+    "**__The Chat ID for this {chat_type} is:__** `{chat_id}`\n\n"
+    "**__NOTE: If you want private notifications, use `/start` in a direct message __**"
+    "**__to theComplane use that positive ID instead.__**"
+)
+
 @bot.on_message(filters.command("start"))
 async def start_cmd(client, message):
     """
     Shows the user their chat ID. This command is NOT restricted 
     as users need it to configure NOTIFICATION_CHAT_ID.
     """
-    chat_type = message.chat.type.name.lower()
+    chat_type = message.chat.type
     
-    if chat_type == 'private':
-        reply_text = (
-            f"👋 **__Bot is Online!__**\n\n"
-            f"__**Your PRIVATE Chat ID is:__** `{message.chat.id}`\n\n"
-            f"**__Action Required: Set this positive ID __**"
-            f"**__in your configuration to receive alerts.__**"
-        )
+    # Enum identity check; the type name is only needed for the group reply
+    if chat_type is ChatType.PRIVATE:
+        reply_text = PRIVATE_START_TMPL.format(chat_id=message.chat.id)
     else:
-         reply_text = (
-            f"👋 **__Bot is Online!__**\n\n"
-            f"**__The Chat ID for this {chat_type.upper()} is:__** `{message.chat.id}`\n\n"
-            f"**__NOTE: If you want private notifications, use `/start` in a direct message __**"
-            f"**__to theComplane use that positive ID instead.__**"
-        )
+        reply_text = GROUP_START_TMPL.format(chat_type=chat_type.name.upper(), chat_id=message.chat.id)
     
     await message.reply(reply_text)
 
+# Summary emoji per user status; anything else (e.g. "Error") shows ❓
+STATUS_EMOJI = {"Online": "🟢", "Offline": "🔴"}
+
+# Reply sent to /check whenever the scrape or the summary fails
+CHECK_FAILED_MESSAGE = "❌ **__Check failed.**\nAn internal error occurred.__"
+
+async def run_check_and_confirm(client, chat_id):
+    """Runs the scraping task and sends a detailed summary report."""
+    global INFLIGHT_CHECK
+    try:
+        # Concurrent /check calls join the running scrape instead of starting their own
+        if INFLIGHT_CHECK is None or INFLIGHT_CHECK.done():
+            # Pass the bot instance (client) to the tracking functions
+            INFLIGHT_CHECK = asyncio.ensure_future(run_checks(client))
+        # shield: one caller being cancelled must not cancel the scrape for the others
+        user_status, forum_counts = await asyncio.shield(INFLIGHT_CHECK)
+
+        # --- Compile Summary Report ---
+        summary_parts = ["✅ **__Manual Check Completed__**\n"]
+
+        # 1. User Status Summary
+        summary_parts.append("👤 **__User Status__**")
+        for name, status in user_status.items():
+            emoji = STATUS_EMOJI.get(status, "❓")
+            summary_parts.append(f"__• {name}: **{status}** {emoji}__")
+
+        summary_parts.append("\n📚 **__Forum Thread Counts__**")
+
+        # 2. Forum Counts Summary
+        for forum, count in forum_counts.items():
+            count_str = str(count) if type(count) is int else "Error"
+            summary_parts.append(f"__• {forum}: **{count_str} threads__**")
+
+        final_message = "\n".join(summary_parts)
+
+        # Send the detailed summary report
+        await client.send_message(chat_id, final_message)
+
+    # Expected upstream failures get a one-line warning. This runs as a detached task, so
+    # anything else is logged with its traceback here; CancelledError still propagates.
+    except (httpx.HTTPError, RPCError, PyMongoError) as e:
+        logger.warning("Error during force check: %s", e)
+        await client.send_message(chat_id, CHECK_FAILED_MESSAGE)
+    except Exception:
+        logger.exception("Unexpected error during force check")
+        await client.send_message(chat_id, CHECK_FAILED_MESSAGE)
+
 @bot.on_message(filters.command("check") & authorized_users_only)
 async def force_check(client, message):
     """
@@ -138,60 +260,64 @@ async def force_check(client, message):
     await asyncio.sleep(1)
     await tmp.delete()
 
-    async def run_check_and_confirm(chat_id):
-        """Runs the scraping task and sends a detailed summary report."""
-        try:
-            async with httpx.AsyncClient(timeout=20.0) as http_client:
-                # Pass the bot instance (client) to the tracking functions
-                user_status = await check_user_status(http_client, client)
-                forum_counts = await check_forums(http_client, client)
-
-            # --- Compile Summary Report ---
-            summary_parts = ["✅ **__Manual Check Completed__**\n"]
-            
-            # 1. User Status Summary
-            summary_parts.append("👤 **__User Status__**")
-            for name, status in user_status.items():
-                emoji = "🟢" if status == "Online" else "🔴" if status == "Offline" else "❓"
-                summary_parts.append(f"__• {name}: **{status}** {emoji}__")
-            
-            summary_parts.append("\n📚 **__Forum Thread Counts__**")
-            
-            # 2. Forum Counts Summary
-            for forum, count in forum_counts.items():
-                count_str = str(count) if isinstance(count, int) else "Error"
-                summary_parts.append(f"__• {forum}: **{count_str} threads__**")
+    # Run in the background: Pyrogram's handler workers are a fixed pool, and a scrape
+    # (possibly queued behind a scheduled one) would otherwise hold a worker throughout
+    task = asyncio.create_task(run_check_and_confirm(client, message.chat.id))
+    CHECK_TASKS.add(task)
+    task.add_done_callback(CHECK_TASKS.discard)
 
-            final_message = "\n".join(summary_parts)
-            
-            # Send the detailed summary report
-            await client.send_message(chat_id, final_message)
-
-        except Exception as e:
-            logger.error(f"Error during force check: {e}")
-            await client.send_message(chat_id, f"❌ **__Check failed.**\nAn internal error occurred.__")
+@bot.on_message(filters.command("check") & ~authorized_users_only)
+async def check_denied(client, message):
+    """
+    Replies to /check from users who are neither the owner nor in AUTH_USERS.
+    """
+    # Channel posts and other non-user messages are ignored silently
+    if not message.from_user:
+        return
+    logger.warning(f"Unauthorized access attempt by user ID: {message.from_user.id}")
+    await message.reply("⛔ **__Access Denied__**\n__You are not authorized to use this command.__")
 
-# Create a new, independent task to run the scraping in the background
-    asyncio.create_task(run_check_and_confirm(message.chat.id))
+async def run_bot():
+    """Starts the bot, signals BOT_READY to the scheduler, then idles until stopped."""
+    await bot.start()
+    BOT_READY.set()
+    await idle()
+    await bot.stop()
 
-# --- Entry Point ---
-if __name__ == "__main__":
+async def main():
+    """Runs the web server, background tasks and the bot on a single event loop."""
     # 1. Start the Fake Web Server (for cloud binding)
     logger.info(f"Starting Web Server on port {PORT}")
-    start_web_server(PORT)
+    runner = await start_web_server(PORT)
 
-    # 2. Start the Bot
-    logger.info("Starting Telegram Bot...")
-    loop = asyncio.get_event_loop()
-    
-    # Create Background Tasks
-    loop.create_task(scheduler())
+    # Create Background Tasks (references are kept so they are not garbage-collected)
+    background_tasks = [asyncio.create_task(scheduler())]
     
     # Create Keep Alive Task (updated as requested)
     if KEEP_ALIVE_URL:
-        loop.create_task(keep_alive())
+        background_tasks.append(asyncio.create_task(keep_alive()))
         logging.info("🌐 Keep-alive task started.")
     else:
         logging.warning("⚠️ Keep-alive task skipped: URL not set.")
-        
-    bot.run()
+
+    # 2. Start the Bot
+    logger.info("Starting Telegram Bot...")
+    try:
+        await run_bot()
+    finally:
+        # run_bot() returns once the bot is stopped; wind the tasks down before closing
+        # the client they use, then release the HTTP connections and the listening socket
+        pending = [*background_tasks, *CHECK_TASKS]
+        # The shared scrape is shielded from its callers' cancellation, so cancel it directly
+        if INFLIGHT_CHECK is not None:
+            pending.append(INFLIGHT_CHECK)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await http_client.aclose()
+        await runner.cleanup()
+
+# --- Entry Point ---
+if __name__ == "__main__":
+    # Pyrogram's run() drives main() on the client's own loop, so no second loop is created
+    bot.run(main())